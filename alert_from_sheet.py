@@ -17,6 +17,7 @@ import os
 import sys
 import time
 import json
+from functools import lru_cache
 from typing import List, Tuple
 
 import gspread
@@ -30,18 +31,17 @@ TAB_LONGBOARD = "Longboard Alert"
 TAB_SHORTBOARD = "Shortboard Alert"
 TAB_SHORTPERIOD = "Short Period Alerts"
 
-# NE .. SE range in TRUE degrees
-DIR_MIN = 25
-DIR_MAX = 160
-
-# Rule thresholds (tune here as needed)
-LONGBOARD_MIN_SWP = 13.0   # seconds
-LONGBOARD_MIN_SWH = 0.7    # feet
-
-SHORTBOARD_MIN_SWP = 13.0  # seconds
-SHORTBOARD_MIN_SWH = 1.6   # feet
-
-SHORTPERIOD_MIN_WVHT = 3.0 # feet
+# Thresholds live in rules.py so there is exactly one place to tune them;
+# the aliases keep this module's shorter names.
+from rules import (
+    DIR_MIN,                                      # NE .. SE range, TRUE degrees
+    DIR_MAX,
+    LP_LONGBOARD_MIN_PERIOD_S as LONGBOARD_MIN_SWP,    # seconds
+    LP_LONGBOARD_MIN_HEIGHT_FT as LONGBOARD_MIN_SWH,   # feet
+    LP_SHORTBOARD_MIN_PERIOD_S as SHORTBOARD_MIN_SWP,  # seconds
+    LP_SHORTBOARD_MIN_HEIGHT_FT as SHORTBOARD_MIN_SWH, # feet
+    SP_MIN_WVHT_FT as SHORTPERIOD_MIN_WVHT,            # feet
+)
 
 # Columns we expect in buoy_data
 EXPECTED_COLS = [
@@ -55,10 +55,15 @@ EXPECTED_COLS = [
     "swp_s",
     "swd_text"
 ]
+NUM_COLS = ["wvht_ft", "dpd_s", "apd_s", "mwd_deg", "swh_ft", "swp_s"]
 # -----------------------------------
 
 
+@lru_cache(maxsize=None)
 def _open_sheet(spreadsheet_id: str):
+    # Memoized: repeated calls in one process reuse the authorized client
+    # and spreadsheet handle instead of re-parsing the key and
+    # re-authorizing. open_by_key avoids gspread's by-name Drive search.
     sa_path = os.path.join("credentials", "google-service-account.json")
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets",
@@ -69,88 +74,107 @@ def _open_sheet(spreadsheet_id: str):
     return client.open_by_key(spreadsheet_id)
 
 
-def _ensure_worksheet(sh, title: str, header: List[str]):
-    try:
-        ws = sh.worksheet(title)
-    except gspread.exceptions.WorksheetNotFound:
-        ws = sh.add_worksheet(title=title, rows=100, cols=max(10, len(header)))
-        ws.append_row(header)
-        return ws
-
-    # Make sure header row matches what we’ll write
-    existing = ws.row_values(1)
-    if existing != header:
-        ws.clear()
-        ws.append_row(header)
-    return ws
+def _ensure_worksheets(sh, titles: List[str], header: List[str]) -> List["gspread.Worksheet"]:
+    """Ensure every tab exists with the expected header row.
+
+    One metadata fetch decides which tabs are missing, one batchUpdate
+    creates them all, one values.batchGet reads every header row, and one
+    values.batchUpdate repairs any that mismatch — instead of lookup +
+    read + write round-trips per tab.
+    """
+    by_title = {ws.title: ws for ws in sh.worksheets()}
+    missing = [t for t in titles if t not in by_title]
+    if missing:
+        resp = sh.batch_update({"requests": [
+            {"addSheet": {"properties": {
+                "title": t,
+                "gridProperties": {"rowCount": 100,
+                                   "columnCount": max(10, len(header))},
+            }}} for t in missing
+        ]})
+        # Build the new Worksheet handles from the addSheet replies
+        # instead of refetching the whole spreadsheet metadata. gspread 6.x
+        # requires the spreadsheet id and client to be passed explicitly.
+        for reply in resp.get("replies", []):
+            props = reply.get("addSheet", {}).get("properties")
+            if props:
+                by_title[props["title"]] = gspread.Worksheet(
+                    sh, props, sh.id, sh.client)
+
+    resp = sh.values_batch_get(ranges=[f"'{t}'!1:1" for t in titles])
+    fixes = []
+    for title, vrange in zip(titles, resp.get("valueRanges", [])):
+        current = vrange.get("values", [[]])[0]
+        if current != header:
+            fixes.append({"range": f"'{title}'!1:1", "values": [header]})
+    if fixes:
+        sh.values_batch_update(body={"valueInputOption": "RAW", "data": fixes})
+
+    return [by_title[t] for t in titles]
 
 
 def _read_buoy_df(sh) -> pd.DataFrame:
     ws = sh.worksheet(BASE_TAB)
-    rows = ws.get_all_records()  # treats first row as header
-    if not rows:
+    # One raw range fetch; skip get_all_records()'s per-row dict construction
+    values = ws.get_values()
+    if len(values) < 2:
         return pd.DataFrame(columns=EXPECTED_COLS)
-    df = pd.DataFrame(rows)
+    df = pd.DataFrame(values[1:], columns=values[0])
 
-    # Normalize columns we care about (coerce types, fill missing)
-    for col in EXPECTED_COLS:
-        if col not in df.columns:
-            df[col] = None
+    # One reindex adds any missing columns and drops extras in a single
+    # allocation, instead of inserting columns one by one
+    df = df.reindex(columns=EXPECTED_COLS)
 
-    # numeric casts
-    for ncol in ["wvht_ft", "dpd_s", "apd_s", "mwd_deg", "swh_ft", "swp_s"]:
-        df[ncol] = pd.to_numeric(df[ncol], errors="coerce")
+    # numeric casts (column-wise apply runs each cast in C)
+    df[NUM_COLS] = df[NUM_COLS].apply(pd.to_numeric, errors="coerce")
 
     # timestamp stays as string; direction text stays as string
-    return df[EXPECTED_COLS].copy()
-
-
-def _between_dir(deg: float, lo: float, hi: float) -> bool:
-    if pd.isna(deg):
-        return False
-    return (deg >= lo) and (deg <= hi)
+    return df
 
 
-def _filter_longboard(df: pd.DataFrame) -> pd.DataFrame:
-    mask = (
-        (df["swp_s"] >= LONGBOARD_MIN_SWP) &
-        (df["swh_ft"] >= LONGBOARD_MIN_SWH) &
-        df["mwd_deg"].apply(lambda d: _between_dir(d, DIR_MIN, DIR_MAX))
-    )
-    return df.loc[mask].copy()
+def _alert_frames(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Return (longboard, shortboard, short-period) frames in one pass.
 
+    The direction window and the swell-period floor are shared between
+    rules, so compute each column comparison once and derive the three
+    masks from them. .between() is NaN-safe (NaN compares False).
+    """
+    dir_mask = df["mwd_deg"].between(DIR_MIN, DIR_MAX)
+    swp_mask = df["swp_s"] >= LONGBOARD_MIN_SWP
+    # Reuse the longboard period mask while the thresholds agree
+    short_swp_mask = (swp_mask if SHORTBOARD_MIN_SWP == LONGBOARD_MIN_SWP
+                      else df["swp_s"] >= SHORTBOARD_MIN_SWP)
 
-def _filter_shortboard(df: pd.DataFrame) -> pd.DataFrame:
-    mask = (
-        (df["swp_s"] >= SHORTBOARD_MIN_SWP) &
-        (df["swh_ft"] >= SHORTBOARD_MIN_SWH) &
-        df["mwd_deg"].apply(lambda d: _between_dir(d, DIR_MIN, DIR_MAX))
-    )
-    return df.loc[mask].copy()
+    long_mask = swp_mask & (df["swh_ft"] >= LONGBOARD_MIN_SWH) & dir_mask
+    short_mask = short_swp_mask & (df["swh_ft"] >= SHORTBOARD_MIN_SWH) & dir_mask
+    sp_mask = (df["wvht_ft"] >= SHORTPERIOD_MIN_WVHT) & dir_mask
 
+    # No .copy(): the slices are read-only from here to _write_frames
+    return df.loc[long_mask], df.loc[short_mask], df.loc[sp_mask]
 
-def _filter_shortperiod(df: pd.DataFrame) -> pd.DataFrame:
-    mask = (
-        (df["wvht_ft"] >= SHORTPERIOD_MIN_WVHT) &
-        df["mwd_deg"].apply(lambda d: _between_dir(d, DIR_MIN, DIR_MAX))
-    )
-    return df.loc[mask].copy()
 
-
-def _write_frame(ws, df: pd.DataFrame):
+def _frame_values(df: pd.DataFrame, now_utc: str) -> List[List]:
     if df.empty:
         # Show a one-line status so the tab is visibly updated
-        ws.clear()
-        ws.update("A1", [["status", "message"],
-                         [time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime()),
-                          "No rows matched this alert window"]])
-        return
-
-    # Prepare values: header + rows
+        return [["status", "message"],
+                [now_utc, "No rows matched this alert window"]]
     header = list(df.columns)
-    values = [header] + df.astype(object).fillna("").values.tolist()
-    ws.clear()
-    ws.update("A1", values)
+    return [header] + df.astype(object).fillna("").values.tolist()
+
+
+def _write_frames(sh, frames: List[Tuple["gspread.Worksheet", pd.DataFrame]]):
+    """Rewrite each worksheet's contents in two API calls total.
+
+    One values.batchClear covering every tab, then one values.batchUpdate
+    carrying a ValueRange per tab — instead of a clear + update round-trip
+    per worksheet. The clear stays so shrinking frames don't leave stale
+    rows behind.
+    """
+    now_utc = time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime())
+    sh.values_batch_clear(body={"ranges": [f"'{ws.title}'" for ws, _ in frames]})
+    data = [{"range": f"'{ws.title}'!A1", "values": _frame_values(df, now_utc)}
+            for ws, df in frames]
+    sh.values_batch_update(body={"valueInputOption": "RAW", "data": data})
 
 
 def main():
@@ -161,23 +185,18 @@ def main():
 
     sh = _open_sheet(sheet_id)
 
-    # Ensure worksheets exist with correct headers
-    long_ws = _ensure_worksheet(sh, TAB_LONGBOARD, EXPECTED_COLS)
-    short_ws = _ensure_worksheet(sh, TAB_SHORTBOARD, EXPECTED_COLS)
-    sp_ws    = _ensure_worksheet(sh, TAB_SHORTPERIOD, EXPECTED_COLS)
+    # Ensure worksheets exist with correct headers (batched round-trips)
+    long_ws, short_ws, sp_ws = _ensure_worksheets(
+        sh, [TAB_LONGBOARD, TAB_SHORTBOARD, TAB_SHORTPERIOD], EXPECTED_COLS)
 
     # Read buoy_data into DataFrame
     df = _read_buoy_df(sh)
 
     # Apply alert filters
-    long_df = _filter_longboard(df)
-    short_df = _filter_shortboard(df)
-    sp_df = _filter_shortperiod(df)
-
-    # Write each tab
-    _write_frame(long_ws, long_df)
-    _write_frame(short_ws, short_df)
-    _write_frame(sp_ws, sp_df)
+    long_df, short_df, sp_df = _alert_frames(df)
+
+    # Write all tabs in one clear + one batched update
+    _write_frames(sh, [(long_ws, long_df), (short_ws, short_df), (sp_ws, sp_df)])
 
     print(f"Done. Longboard={len(long_df)} Shortboard={len(short_df)} ShortPeriod={len(sp_df)}")
 
@@ -11,12 +11,13 @@ WaveWatchr_Excel • fetch_and_write.py
 """
 
 from __future__ import annotations
-import os, sys, json, math, typing as T
+import os, sys, json, threading, typing as T
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import requests
 
-from sheet_tools import get_sheets_service, ensure_tab, append_rows, write_status
-from rules import longboard_ok, shortboard_ok, short_period_ok  # backward-compatible names
+from sheet_tools import get_sheets_service, ensure_tabs, AppendQueue
+from rules import evaluate_all
 
 RAW_TAB = "buoy_data"
 ALERT_TABS = {
@@ -37,10 +38,15 @@ FIELDS = [
     "swd_text",      # direction text (ENE, E, etc.)
 ]
 
-NDBC_STD_URL  = "https://www.ndbc.noaa.gov/data/realtime2/{station}.txt"
-NDBC_SPEC_URL = "https://www.ndbc.noaa.gov/data/realtime2/{station}.spec"
+NDBC_BASE_URL = "https://www.ndbc.noaa.gov/data/realtime2/"
 FT_PER_M = 3.28084
 
+# One pooled session so the .txt/.spec fetches (2 per station) reuse the
+# same TCP+TLS connection instead of a fresh handshake per request
+_SESSION = requests.Session()
+_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_SESSION.headers.update({"User-Agent": "WaveWatchr_Excel (github.com/C0deCr4fter/WaveWatchr_Excel)"})
+
 # ---------- config ----------
 def _json_config() -> dict:
     env_json = os.environ.get("STATION_CONFIG_JSON")
@@ -77,23 +83,90 @@ def _round1(x: T.Optional[float]) -> T.Optional[float]:
     return None if x is None else round(float(x), 1)
 
 def _m_to_ft(x_m: T.Optional[float]) -> T.Optional[float]:
-    return None if x_m is None else round(x_m * FT_PER_M, 2)
+    # No rounding here: callers round exactly once at display precision
+    return None if x_m is None else x_m * FT_PER_M
 
 def _iso_utc(y,m,d,h,mi) -> str:
-    return datetime((2000 + y) if y < 100 else y, m, d, h, mi, tzinfo=timezone.utc).isoformat().replace("+00:00","+00:00")
+    return datetime((2000 + y) if y < 100 else y, m, d, h, mi, tzinfo=timezone.utc).isoformat()
+
+_COMPASS = ("N","NNE","NE","ENE","E","ESE","SE","SSE","S","SSW","SW","WSW","W","WNW","NW","NNW")
+_COMPASS_SCALE = 16.0 / 360.0  # one sector per 22.5 degrees
 
 def _deg_to_cardinal(deg: T.Optional[float]) -> T.Optional[str]:
-    if deg is None or (isinstance(deg, float) and math.isnan(deg)):  # type: ignore[name-defined]
+    if deg is None:
         return None
-    dirs = ["N","NNE","NE","ENE","E","ESE","SE","SSE","S","SSW","SW","WSW","W","WNW","NW","NNW"]
-    ix = int((float(deg) % 360)/22.5 + 0.5) % 16
-    return dirs[ix]
+    d = float(deg)
+    if d != d:  # NaN
+        return None
+    return _COMPASS[int((d % 360) * _COMPASS_SCALE + 0.5) & 15]
+
+# Conditional-GET cache: NDBC updates realtime2 files every ~10 minutes,
+# so send If-None-Match/If-Modified-Since and reuse the cached line on 304.
+# Persisted under data/ so repeated runs on the same host benefit.
+_HTTP_CACHE_PATH = os.path.join("data", "ndbc_http_cache.json")
+_http_cache: T.Optional[dict] = None
+_http_cache_lock = threading.Lock()
+
+
+def _load_http_cache() -> dict:
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            try:
+                with open(_HTTP_CACHE_PATH, "r", encoding="utf-8") as f:
+                    _http_cache = json.load(f)
+            except (OSError, ValueError):
+                _http_cache = {}
+        return _http_cache
+
+
+def _save_http_cache():
+    # Snapshot under the lock, write outside it: worker threads keep
+    # inserting while the json dump does disk I/O
+    with _http_cache_lock:
+        if _http_cache is None:
+            return
+        snapshot = dict(_http_cache)
+    try:
+        os.makedirs(os.path.dirname(_HTTP_CACHE_PATH), exist_ok=True)
+        with open(_HTTP_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+    except OSError:
+        pass  # cache is best-effort only
+
 
 def _fetch_first_data_line(url: str) -> T.Optional[str]:
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    lines = [ln for ln in r.text.splitlines() if ln and not ln.startswith("#")]
-    return lines[0] if lines else None  # newest first
+    cache = _load_http_cache()
+    entry = cache.get(url, {})
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    # Stream so we read ~1 KB (headers + comment lines + newest row)
+    # instead of decoding the entire ~45-day history
+    with _SESSION.get(url, timeout=20, headers=headers, stream=True) as r:
+        if r.status_code == 304 and "line" in entry:
+            return entry["line"]
+        r.raise_for_status()
+
+        # realtime2 files are plain ASCII; pinning the encoding stops
+        # requests from running charset detection over the body
+        r.encoding = "ascii"
+
+        # realtime2 files are newest-first: stop at the first non-comment line
+        line = next((ln for ln in r.iter_lines(decode_unicode=True)
+                     if ln and not ln.startswith("#")), None)
+        # Insert under the lock: fetches run on worker threads, and the
+        # sidecar is written once at end of run rather than per fetch
+        with _http_cache_lock:
+            cache[url] = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "line": line,
+            }
+    return line
 
 # ---------- data fetch ----------
 def fetch_latest_obs(station: str) -> dict:
@@ -101,15 +174,19 @@ def fetch_latest_obs(station: str) -> dict:
     Build an obs dict that includes BOTH canonical keys used by rules.py AND
     short-header aliases used by the sheet.
     """
-    std = _fetch_first_data_line(NDBC_STD_URL.format(station=station))
-    spec = _fetch_first_data_line(NDBC_SPEC_URL.format(station=station))
+    # Both feeds are independent I/O: fetch them concurrently
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        std_f = ex.submit(_fetch_first_data_line, NDBC_BASE_URL + station + ".txt")
+        spec_f = ex.submit(_fetch_first_data_line, NDBC_BASE_URL + station + ".spec")
+    std, spec = std_f.result(), spec_f.result()
 
     obs: dict = {"station_id": station}
 
     # ---- standard file (.txt)
     # YY MM DD hh mm WDIR WSPD GST WVHT DPD APD MWD ...
     if std:
-        p = std.strip().split()
+        # only fields 0-11 are read; maxsplit leaves the tail untokenized
+        p = std.split(None, 12)
         if len(p) >= 12:
             yy, mm, dd, hh, mi = map(int, p[0:5])
             wdir = _safe_float(p[5])
@@ -168,14 +245,11 @@ def fetch_latest_obs(station: str) -> dict:
 
 # ---------- alerts ----------
 def build_row(fields: T.List[str], obs: dict) -> T.List[T.Any]:
-    return [obs.get(k) for k in fields]
+    get = obs.get  # bind once; skips the per-key method lookup
+    return [get(k) for k in fields]
 
 def any_alerts(row: dict) -> T.Dict[str,bool]:
-    return {
-        "Longboard":   bool(longboard_ok(row)),
-        "Shortboard":  bool(shortboard_ok(row)),
-        "Short Period":bool(short_period_ok(row)),
-    }
+    return evaluate_all(row)
 
 # ---------- main ----------
 def main() -> int:
@@ -184,42 +258,56 @@ def main() -> int:
     spreadsheet_id  = cfg["spreadsheet_id"]
 
     sa_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS") or "credentials/google-service-account.json"
-    if not os.path.exists(sa_path):
-        raise FileNotFoundError(f"Service account file not found at '{sa_path}'")
+    # No exists() pre-check: from_service_account_file raises a clear
+    # FileNotFoundError itself, and the service is cached per path
     service = get_sheets_service(sa_path)
 
-    # Ensure tabs with standardized headers
-    ensure_tab(service, spreadsheet_id, RAW_TAB, FIELDS)
-    for tab in ALERT_TABS.values():
-        ensure_tab(service, spreadsheet_id, tab, FIELDS)
+    # Ensure tabs with standardized headers (one metadata fetch + one batchUpdate)
+    id_map = ensure_tabs(service, spreadsheet_id, [RAW_TAB, *ALERT_TABS.values()], FIELDS)
 
     totals = {"Longboard":0,"Shortboard":0,"Short Period":0}
-    wrote_any = False
 
-    for st in stations:
-        print(f"Fetching NDBC data for station {st} …", flush=True)
-        obs = fetch_latest_obs(st)
+    # Queue coalesces all appends across tabs into one batched API call
+    queue = AppendQueue(service, spreadsheet_id, id_map)
+
+    # Fetch all stations concurrently (I/O-bound); keep Sheets writes
+    # sequential afterwards so row order stays deterministic
+    print(f"Fetching NDBC data for stations {', '.join(stations)} …", flush=True)
+    # `or 1`: an empty station list is valid config and should fall
+    # through to the "No matches" status lines, not crash the executor
+    with ThreadPoolExecutor(max_workers=min(16, len(stations)) or 1) as ex:
+        obs_list = list(ex.map(fetch_latest_obs, stations))
+    _save_http_cache()
+
+    for st, obs in zip(stations, obs_list):
         obs["station_id"] = st  # enforce
         row = build_row(FIELDS, obs)
-        append_rows(service, spreadsheet_id, RAW_TAB, [row])
-        wrote_any = True
+        queue.add(RAW_TAB, [row])
 
         flags = any_alerts(obs)
         for name, hit in flags.items():
             if hit:
-                append_rows(service, spreadsheet_id, ALERT_TABS[name], [row])
+                queue.add(ALERT_TABS[name], [row])
                 totals[name] += 1
 
-    # status lines if zero matches
-    ts = datetime.utcnow().strftime('%Y-%m-%d %H:%MZ')
+    wrote_any = bool(obs_list)
+
+    # One clock read for all reporting, instead of a fresh
+    # utcnow()+strftime per status line and per print
+    now = datetime.now(timezone.utc)
+    ts = now.strftime('%Y-%m-%d %H:%MZ')
+    ts_full = now.strftime('%Y-%m-%dT%H:%M:%S+0000')
+
+    # Fold no-match status lines into the same batch as the data rows
     for name, tab in ALERT_TABS.items():
         if totals[name] == 0:
-            write_status(service, spreadsheet_id, tab, f"No matches this run at {ts}")
+            queue.add(tab, [[f"No matches this run at {ts}"]])
+    queue.flush()
 
     if wrote_any and all(v==0 for v in totals.values()):
-        print(f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S+0000')} – ran, no alert matches")
+        print(f"{ts_full} – ran, no alert matches")
     else:
-        print(f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S+0000')} – matches " +
+        print(f"{ts_full} – matches " +
               ", ".join(f"{k}:{v}" for k,v in totals.items()))
     return 0
 
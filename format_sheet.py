@@ -4,128 +4,199 @@
 
 import os
 from typing import Dict, List
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+
+from googleapiclient.errors import HttpError
+
+from sheet_tools import execute_with_backoff, get_sheets_service
 
 # Change this if your tab is named differently
 TAB_NAME = "buoy_data"  # or whatever your base/raw data tab is actually called
 
-SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-
 def get_service():
     # Prefer GOOGLE_APPLICATION_CREDENTIALS. Fallback to service_account.json in repo.
+    # Delegates to sheet_tools so the credentials parse + client build is
+    # done (and memoized) in exactly one place.
     cred_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS") or os.path.join(os.getcwd(), "service_account.json")
-    creds = Credentials.from_service_account_file(cred_path, scopes=SCOPES)
-    return build("sheets", "v4", credentials=creds, cache_discovery=False)
+    return get_sheets_service(cred_path)
 
-def get_sheet_id(service, spreadsheet_id: str, title: str) -> int:
-    meta = service.spreadsheets().get(
-        spreadsheetId=spreadsheet_id,
-        fields="sheets(properties(sheetId,title))"
-    ).execute()
+def get_sheet_id_and_headers(service, spreadsheet_id: str, title: str):
+    """Fetch the tab's sheetId, header row, and current formatting in one spreadsheets.get.
+
+    The returned `current` dict (frozen row count, header bold/alignment,
+    first data row's number formats, column widths) lets the caller skip
+    format requests that are already applied.
+    """
+    try:
+        meta = execute_with_backoff(service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"'{title}'!1:2"],
+            fields=("sheets(properties(sheetId,title,gridProperties.frozenRowCount),"
+                    "data(rowData(values(formattedValue,"
+                    "userEnteredFormat(numberFormat,textFormat.bold,horizontalAlignment))),"
+                    "columnMetadata(pixelSize)))")
+        ))
+    except HttpError as e:
+        # A missing tab makes the ranged get fail with 400 "Unable to
+        # parse range"; keep raising the original, clearer error
+        if e.resp is not None and e.resp.status == 400:
+            raise RuntimeError(f"Tab not found: {title}") from e
+        raise
     for s in meta.get("sheets", []):
         props = s.get("properties", {})
         if props.get("title") == title:
-            return int(props["sheetId"])
+            data0 = (s.get("data") or [{}])[0]
+            rows = data0.get("rowData", [])
+            row1 = rows[0].get("values", []) if rows else []
+            row2 = rows[1].get("values", []) if len(rows) > 1 else []
+            headers = [v.get("formattedValue", "").strip() for v in row1]
+            # rowData, unlike values.get, includes trailing cells that
+            # carry only formatting; trim them so widths and number
+            # formats are derived from real headers only
+            while headers and not headers[-1]:
+                headers.pop()
+            current = {
+                "frozen": props.get("gridProperties", {}).get("frozenRowCount", 0),
+                "header_fmt": [
+                    (v.get("userEnteredFormat", {}).get("textFormat", {}).get("bold", False),
+                     v.get("userEnteredFormat", {}).get("horizontalAlignment"))
+                    for v in row1
+                ],
+                "patterns": [
+                    (nf["type"], nf.get("pattern"))
+                    if (nf := v.get("userEnteredFormat", {}).get("numberFormat")) else None
+                    for v in row2
+                ],
+                "widths": [c.get("pixelSize") for c in data0.get("columnMetadata", [])],
+            }
+            return int(props["sheetId"]), headers, current
     raise RuntimeError(f"Tab not found: {title}")
 
-def get_headers(service, spreadsheet_id: str, title: str) -> List[str]:
-    res = service.spreadsheets().values().get(
-        spreadsheetId=spreadsheet_id,
-        range=f"{title}!1:1"
-    ).execute()
-    return [h.strip() for h in res.get("values", [[]])[0]]
-
-def build_format_requests(sheet_id: int, headers: List[str]) -> List[Dict]:
+# Header-to-format classification tables, resolved by dict lookup instead
+# of a per-column endswith chain
+_DATETIME_FORMAT = ("DATE_TIME", "yyyy-mm-dd hh:mm:ss\"Z\"")
+_EXACT_FORMATS = {
+    "station_id": ("NUMBER", "0"),
+    "station": ("NUMBER", "0"),
+}
+_SUFFIX_FORMATS = {
+    "_ft": ("NUMBER", "0.0"),   # wave_height_ft, swell_height_ft
+    "_s": ("NUMBER", "0.0"),    # dominant_period_s, swell_period_s
+    "_deg": ("NUMBER", "0"),    # wind_dir_deg, mean_wave_dir_deg
+    "_kt": ("NUMBER", "0"),     # wind_speed_kt
+}
+
+
+def _classify_header(lower: str):
+    """Return the (type, pattern) for a lowercased header, or None for text."""
+    if "time" in lower:                       # timestamp_utc, etc.
+        return _DATETIME_FORMAT
+    if lower in _EXACT_FORMATS:
+        return _EXACT_FORMATS[lower]
+    i = lower.rfind("_")
+    # leave as text for things like wind_direction (ENE, E, etc.)
+    return _SUFFIX_FORMATS.get(lower[i:]) if i >= 0 else None
+
+
+def _runs(values: List):
+    """Yield (start, end, value) for runs of equal adjacent values."""
+    start = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or values[i] != values[start]:
+            yield start, i, values[start]
+            start = i
+
+
+def build_format_requests(sheet_id: int, headers: List[str],
+                          current: Dict = None) -> List[Dict]:
+    """Build the batchUpdate requests for a tab.
+
+    When `current` (from get_sheet_id_and_headers) is given, requests whose
+    effect is already in place are skipped, so a steady-state run produces
+    an empty list and the caller can skip the batchUpdate entirely.
+    """
     requests: List[Dict] = []
+    current = current or {}
 
     # 1) Freeze header row
-    requests.append({
-        "updateSheetProperties": {
-            "properties": {"sheetId": sheet_id, "gridProperties": {"frozenRowCount": 1}},
-            "fields": "gridProperties.frozenRowCount"
-        }
-    })
+    if current.get("frozen") != 1:
+        requests.append({
+            "updateSheetProperties": {
+                "properties": {"sheetId": sheet_id, "gridProperties": {"frozenRowCount": 1}},
+                "fields": "gridProperties.frozenRowCount"
+            }
+        })
 
     # 2) Header style
-    requests.append({
-        "repeatCell": {
-            "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1},
-            "cell": {
-                "userEnteredFormat": {
-                    "textFormat": {"bold": True},
-                    "horizontalAlignment": "CENTER"
-                }
-            },
-            "fields": "userEnteredFormat(textFormat,horizontalAlignment)"
-        }
-    })
+    header_fmt = current.get("header_fmt", [])
+    if (len(header_fmt) < len(headers)
+            or any(fmt != (True, "CENTER") for fmt in header_fmt[:len(headers)])):
+        # Bounded to the real header columns so no formatting-only cells
+        # are created past them
+        requests.append({
+            "repeatCell": {
+                "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1,
+                          "startColumnIndex": 0, "endColumnIndex": len(headers)},
+                "cell": {
+                    "userEnteredFormat": {
+                        "textFormat": {"bold": True},
+                        "horizontalAlignment": "CENTER"
+                    }
+                },
+                "fields": "userEnteredFormat(textFormat,horizontalAlignment)"
+            }
+        })
 
-    # 3) Column widths (optional sane defaults)
-    for col_index in range(len(headers)):
-        width = 210 if col_index == 0 else 110  # timestamp wider
+    # 3) Column widths (optional sane defaults) — one request per run of
+    # equal widths, not one per column; runs already at the right width
+    # are skipped
+    cur_widths = current.get("widths", [])
+    widths = [210 if i == 0 else 110 for i in range(len(headers))]  # timestamp wider
+    for start, end, width in _runs(widths):
+        if cur_widths[start:end] == [width] * (end - start):
+            continue
         requests.append({
             "updateDimensionProperties": {
-                "range": {"sheetId": sheet_id, "dimension": "COLUMNS", "startIndex": col_index, "endIndex": col_index + 1},
+                "range": {"sheetId": sheet_id, "dimension": "COLUMNS", "startIndex": start, "endIndex": end},
                 "properties": {"pixelSize": width},
                 "fields": "pixelSize"
             }
         })
 
     # 4) Number formats by header name pattern
-    def fmt_number(col, pattern):
+    def fmt_cells(start, end, ftype, pattern):
         return {
             "repeatCell": {
-                "range": {"sheetId": sheet_id, "startRowIndex": 1, "startColumnIndex": col, "endColumnIndex": col + 1},
-                "cell": {"userEnteredFormat": {"numberFormat": {"type": "NUMBER", "pattern": pattern}}},
+                "range": {"sheetId": sheet_id, "startRowIndex": 1, "startColumnIndex": start, "endColumnIndex": end},
+                "cell": {"userEnteredFormat": {"numberFormat": {"type": ftype, "pattern": pattern}}},
                 "fields": "userEnteredFormat.numberFormat"
             }
         }
 
-    def fmt_datetime(col, pattern="yyyy-mm-dd hh:mm:ss\"Z\""):
-        return {
-            "repeatCell": {
-                "range": {"sheetId": sheet_id, "startRowIndex": 1, "startColumnIndex": col, "endColumnIndex": col + 1},
-                "cell": {"userEnteredFormat": {"numberFormat": {"type": "DATE_TIME", "pattern": pattern}}},
-                "fields": "userEnteredFormat.numberFormat"
-            }
-        }
+    # Classify each header, then emit one repeatCell per run of columns
+    # sharing the same (type, pattern)
+    specs = [_classify_header(name.lower()) for name in headers]
 
-    # Map headers to formats
-    for idx, name in enumerate(headers):
-        lower = name.lower()
-
-        if "time" in lower:                         # timestamp_utc, etc.
-            requests.append(fmt_datetime(idx))
-        elif lower.endswith("_ft"):                 # wave_height_ft, swell_height_ft
-            requests.append(fmt_number(idx, "0.0"))
-        elif lower.endswith("_s"):                  # dominant_period_s, swell_period_s
-            requests.append(fmt_number(idx, "0.0"))
-        elif lower.endswith("_deg"):                # wind_dir_deg, mean_wave_dir_deg
-            requests.append(fmt_number(idx, "0"))
-        elif lower.endswith("_kt"):                 # wind_speed_kt
-            requests.append(fmt_number(idx, "0"))
-        elif lower in ("station_id", "station"):
-            requests.append(fmt_number(idx, "0"))
-        else:
-            # leave as text for things like wind_direction (ENE, E, etc.)
-            pass
+    cur_patterns = current.get("patterns", [])
+    for start, end, spec in _runs(specs):
+        if spec is not None and cur_patterns[start:end] != [spec] * (end - start):
+            requests.append(fmt_cells(start, end, *spec))
 
     return requests
 
 def format_tab(spreadsheet_id: str, title: str):
     service = get_service()
-    sheet_id = get_sheet_id(service, spreadsheet_id, title)
-    headers = get_headers(service, spreadsheet_id, title)
+    sheet_id, headers, current = get_sheet_id_and_headers(service, spreadsheet_id, title)
     if not headers:
         raise RuntimeError(f"No headers found in first row of {title}")
 
-    requests = build_format_requests(sheet_id, headers)
-    if requests:
-        service.spreadsheets().batchUpdate(
-            spreadsheetId=spreadsheet_id,
-            body={"requests": requests}
-        ).execute()
+    requests = build_format_requests(sheet_id, headers, current)
+    if not requests:
+        print(f"Tab '{title}' already formatted; nothing to do")
+        return
+    execute_with_backoff(service.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": requests}
+    ))
     print(f"Formatted tab '{title}' in spreadsheet {spreadsheet_id}")
 
 if __name__ == "__main__":
@@ -13,38 +13,104 @@ LP_SHORTBOARD_MIN_HEIGHT_FT = 1.6
 SP_MIN_WVHT_FT = 3.0
 # ---- end thresholds ----
 
-def _first_num(row, *keys):
+# Alias priority per field, materialized once instead of a fresh varargs
+# tuple per call. Prefer real swell values, then dominant/total; support
+# both short & long keys.
+_KEYS_SWELL_PERIOD = ("swell_period_s", "swp_s", "SwP",
+                      "dominant_period_s", "dpd_s", "DPD")
+_KEYS_SWELL_HEIGHT = ("swell_height_ft", "swh_ft", "SwH_ft", "SwH",
+                      "wave_height_ft", "wvht_ft", "WVHT_ft", "WVHT")
+_KEYS_WAVE_HEIGHT = ("wave_height_ft", "wvht_ft", "WVHT_ft", "WVHT")
+_KEYS_SWELL_OR_MEAN_DIR = ("swell_dir_deg_true", "mean_wave_dir_deg",
+                           "mwd_deg", "MWD", "wind_dir_deg")
+_KEYS_MEAN_DIR = ("mean_wave_dir_deg", "mwd_deg", "MWD", "wind_dir_deg")
+
+def _first_num(row, keys):
     for k in keys:
         v = row.get(k)
-        if v in ("", None):
-            continue
-        try:
-            return float(v)
-        except Exception:
-            pass
+        if v not in (None, ""):
+            try:
+                return float(v)
+            except (TypeError, ValueError):
+                pass
     return None
 
 def _deg_ok(x, lo=DIR_MIN, hi=DIR_MAX):
     try:
         d = float(x)
-    except Exception:
+    except (TypeError, ValueError):
         return False
     return lo <= d <= hi
 
 def _swell_period_s(row):
-    # Prefer real swell period, then dominant period; support both short & long keys.
-    return _first_num(row, "swell_period_s", "swp_s", "SwP",
-                           "dominant_period_s", "dpd_s", "DPD")
+    return _first_num(row, _KEYS_SWELL_PERIOD)
 
 def _swell_height_ft(row):
-    return _first_num(row, "swell_height_ft", "swh_ft", "SwH_ft", "SwH",
-                           "wave_height_ft", "wvht_ft", "WVHT_ft", "WVHT")
+    return _first_num(row, _KEYS_SWELL_HEIGHT)
 
 def _swell_or_mean_dir_deg(row):
-    return _first_num(row, "swell_dir_deg_true", "mean_wave_dir_deg", "mwd_deg", "MWD", "wind_dir_deg")
+    return _first_num(row, _KEYS_SWELL_OR_MEAN_DIR)
 
 def _mean_dir_deg(row):
-    return _first_num(row, "mean_wave_dir_deg", "mwd_deg", "MWD", "wind_dir_deg")
+    return _first_num(row, _KEYS_MEAN_DIR)
+
+def evaluate_all(row):
+    """Evaluate all three rules with one pass over the row's fields.
+
+    The individual is_* predicates each re-resolve the same aliased keys;
+    this pulls period/height/direction out once and runs the comparisons
+    against locals.
+    """
+    p = _swell_period_s(row)
+    h = _swell_height_ft(row)
+    d_ok = _deg_ok(_swell_or_mean_dir_deg(row))
+    wvht = _first_num(row, _KEYS_WAVE_HEIGHT)
+    md_ok = _deg_ok(_mean_dir_deg(row))
+    return {
+        "Longboard": (p is not None and p >= LP_LONGBOARD_MIN_PERIOD_S
+                      and h is not None and h >= LP_LONGBOARD_MIN_HEIGHT_FT
+                      and d_ok),
+        "Shortboard": (p is not None and p >= LP_SHORTBOARD_MIN_PERIOD_S
+                       and h is not None and h >= LP_SHORTBOARD_MIN_HEIGHT_FT
+                       and d_ok),
+        "Short Period": (wvht is not None and wvht > SP_MIN_WVHT_FT and md_ok),
+    }
+
+def evaluate_rules_batch(rows):
+    """Vectorized evaluate_all over a list of row dicts.
+
+    Resolves each aliased field once per row into float64 arrays (NaN for
+    missing) and evaluates the three rules as NumPy boolean expressions —
+    NaN compares False, matching the scalar None handling. Returns
+    {rule name: bool array aligned with rows}. Meant for backfills where
+    per-row predicate calls would be interpreter-bound.
+    """
+    # Imported here so the scalar path (the scheduled fetch) never pays
+    # numpy's import cost on cold start
+    import numpy as np
+
+    n = len(rows)
+
+    def _col(extract):
+        return np.fromiter(
+            (np.nan if (v := extract(r)) is None else v for r in rows),
+            np.float64, count=n)
+
+    p = _col(_swell_period_s)
+    h = _col(_swell_height_ft)
+    d = _col(_swell_or_mean_dir_deg)
+    wvht = _col(lambda r: _first_num(r, _KEYS_WAVE_HEIGHT))
+    md = _col(_mean_dir_deg)
+
+    d_ok = (d >= DIR_MIN) & (d <= DIR_MAX)
+    md_ok = (md >= DIR_MIN) & (md <= DIR_MAX)
+    return {
+        "Longboard": (p >= LP_LONGBOARD_MIN_PERIOD_S)
+                     & (h >= LP_LONGBOARD_MIN_HEIGHT_FT) & d_ok,
+        "Shortboard": (p >= LP_SHORTBOARD_MIN_PERIOD_S)
+                      & (h >= LP_SHORTBOARD_MIN_HEIGHT_FT) & d_ok,
+        "Short Period": (wvht > SP_MIN_WVHT_FT) & md_ok,
+    }
 
 def is_long_period_longboard(row):
     p = _swell_period_s(row)
@@ -63,7 +129,7 @@ def is_long_period_shortboard(row):
             and _deg_ok(d))
 
 def is_short_period_all(row):
-    wvht = _first_num(row, "wave_height_ft", "wvht_ft", "WVHT_ft", "WVHT")
+    wvht = _first_num(row, _KEYS_WAVE_HEIGHT)
     d = _mean_dir_deg(row)
     return (wvht is not None and wvht > SP_MIN_WVHT_FT and _deg_ok(d))
 
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import random
+import time
+from functools import lru_cache
 from typing import Dict, List, Optional
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
@@ -8,64 +11,191 @@ from googleapiclient.errors import HttpError
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
 
+# HTTP statuses worth retrying: rate-limit overage and transient backend
+# errors. Anything else (403, 404, bad request) fails fast.
+_RETRY_STATUSES = (429, 500, 503)
 
+
+def execute_with_backoff(request, tries: int = 6):
+    """Execute a googleapis request, retrying quota and server errors.
+
+    A burst over the per-minute quota surfaces as a 429; without backoff
+    one such response fails the whole run. Retries with capped
+    exponential backoff plus jitter (1s, 2s, 4s ... 30s max) so parallel
+    cron runs don't re-collide, and re-raises anything non-transient.
+    """
+    for attempt in range(tries):
+        try:
+            return request.execute()
+        except HttpError as e:
+            status = e.resp.status if e.resp is not None else None
+            if status not in _RETRY_STATUSES or attempt == tries - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30) + random.random())
+
+
+@lru_cache(maxsize=None)
 def get_sheets_service(sa_path: str):
+    """Build (and cache) the Sheets service for a service-account file.
+
+    Parsing the key, minting credentials, and building the discovery
+    client are all one-time costs; repeated calls in the same process
+    reuse the same service object.
+    """
     creds = Credentials.from_service_account_file(sa_path, scopes=SCOPES)
-    return build("sheets", "v4", credentials=creds)
+    # static_discovery uses the discovery doc bundled with the client
+    # library, skipping the HTTPS fetch + ~300 KB JSON parse on cold start
+    return build("sheets", "v4", credentials=creds,
+                 cache_discovery=False, static_discovery=True)
 
 
 def _get_sheet_id_map(service, spreadsheet_id: str) -> Dict[str, int]:
-    meta = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
+    # Only titles and ids are needed; the fields mask keeps the response
+    # small even on workbooks with many heavily formatted tabs
+    meta = execute_with_backoff(service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields="sheets(properties(sheetId,title))",
+    ))
     sheets = meta.get("sheets", [])
     return {s["properties"]["title"]: s["properties"]["sheetId"] for s in sheets}
 
 
-def ensure_tab(service, spreadsheet_id: str, title: str, header: Optional[List[str]] = None):
-    """Create a sheet/tab if it doesn't exist. Optionally write headers if tab is empty."""
+def ensure_tabs(service, spreadsheet_id: str, titles: List[str], header: Optional[List[str]] = None):
+    """Create any missing tabs in one batchUpdate. Optionally write headers to empty tabs.
+
+    One spreadsheets.get for all titles instead of one per tab, and a single
+    batchUpdate carrying an addSheet request per missing tab. Returns the
+    title -> sheetId map so callers can batch later grid operations without
+    refetching metadata.
+    """
     id_map = _get_sheet_id_map(service, spreadsheet_id)
-    if title not in id_map:
-        requests = [{
-            "addSheet": {"properties": {"title": title}}
-        }]
-        service.spreadsheets().batchUpdate(
+    missing = [t for t in titles if t not in id_map]
+    if missing:
+        requests = [{"addSheet": {"properties": {"title": t}}} for t in missing]
+        resp = execute_with_backoff(service.spreadsheets().batchUpdate(
             spreadsheetId=spreadsheet_id, body={"requests": requests}
-        ).execute()
+        ))
+        for reply in resp.get("replies", []):
+            props = reply.get("addSheet", {}).get("properties", {})
+            if props:
+                id_map[props["title"]] = props["sheetId"]
 
-    # Check if header is needed
+    # Check which tabs still need a header row: one batchGet over all
+    # header ranges, then one batchUpdate writing the missing ones
     if header:
-        rng = f"'{title}'!1:1"
-        resp = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id, range=rng, majorDimension="ROWS"
-        ).execute()
-        current = resp.get("values", [])
-        if not current:
-            service.spreadsheets().values().update(
+        resp = execute_with_backoff(service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"'{t}'!1:1" for t in titles],
+            majorDimension="ROWS",
+        ))
+        data = [
+            {"range": f"'{title}'!1:1", "values": [header]}
+            for title, vrange in zip(titles, resp.get("valueRanges", []))
+            if not vrange.get("values")
+        ]
+        if data:
+            execute_with_backoff(service.spreadsheets().values().batchUpdate(
                 spreadsheetId=spreadsheet_id,
-                range=rng,
-                valueInputOption="RAW",
-                body={"values": [header]},
-            ).execute()
+                body={"valueInputOption": "RAW", "data": data},
+            ))
+
+    return id_map
+
+
+def ensure_tab(service, spreadsheet_id: str, title: str, header: Optional[List[str]] = None):
+    """Create a sheet/tab if it doesn't exist. Optionally write headers if tab is empty."""
+    ensure_tabs(service, spreadsheet_id, [title], header)
 
 
 def append_rows(service, spreadsheet_id: str, title: str, rows: List[List]):
     if not rows:
         return
     rng = f"'{title}'!A1"
-    service.spreadsheets().values().append(
+    execute_with_backoff(service.spreadsheets().values().append(
         spreadsheetId=spreadsheet_id,
         range=rng,
         valueInputOption="RAW",
         insertDataOption="INSERT_ROWS",
         body={"values": rows},
-    ).execute()
+    ))
+
+
+def _cell_data(value) -> Dict:
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+def append_rows_batch(service, spreadsheet_id: str,
+                      rows_by_tab: Dict[str, List[List]],
+                      id_map: Optional[Dict[str, int]] = None):
+    """Append rows to several tabs in one spreadsheets.batchUpdate.
+
+    Uses appendCells requests (append semantics, unlike values.update),
+    so N tabs cost one round-trip instead of one values.append each.
+    Pass the id_map from ensure_tabs to skip the metadata refetch.
+    """
+    rows_by_tab = {t: rows for t, rows in rows_by_tab.items() if rows}
+    if not rows_by_tab:
+        return
+    if id_map is None:
+        id_map = _get_sheet_id_map(service, spreadsheet_id)
+    requests = [{
+        "appendCells": {
+            "sheetId": id_map[title],
+            "rows": [{"values": [_cell_data(v) for v in row]} for row in rows],
+            "fields": "userEnteredValue",
+        }
+    } for title, rows in rows_by_tab.items()]
+    execute_with_backoff(service.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id, body={"requests": requests}
+    ))
+
+
+class AppendQueue:
+    """Coalesces row appends and flushes them in one batched API call.
+
+    add() only buffers in-process; flush() hands everything to
+    append_rows_batch, so a run's worth of appends across any number of
+    tabs costs a single round-trip. The buffer auto-flushes when it
+    reaches max_rows to bound memory on large backfills.
+    """
+
+    def __init__(self, service, spreadsheet_id: str,
+                 id_map: Optional[Dict[str, int]] = None, max_rows: int = 500):
+        self._service = service
+        self._spreadsheet_id = spreadsheet_id
+        self._id_map = id_map
+        self._max_rows = max_rows
+        self._buf: Dict[str, List[List]] = {}
+        self._count = 0
+
+    def add(self, title: str, rows: List[List]):
+        if not rows:
+            return
+        self._buf.setdefault(title, []).extend(rows)
+        self._count += len(rows)
+        if self._count >= self._max_rows:
+            self.flush()
+
+    def flush(self):
+        if not self._count:
+            return
+        append_rows_batch(self._service, self._spreadsheet_id, self._buf, self._id_map)
+        self._buf = {}
+        self._count = 0
 
 
 def write_status(service, spreadsheet_id: str, title: str, message: str):
     rng = f"'{title}'!A1"
-    service.spreadsheets().values().append(
+    execute_with_backoff(service.spreadsheets().values().append(
         spreadsheetId=spreadsheet_id,
         range=rng,
         valueInputOption="RAW",
         insertDataOption="INSERT_ROWS",
         body={"values": [[message]]},
-    ).execute()
+    ))